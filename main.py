@@ -1,17 +1,23 @@
 import os
 import requests
 import time
-import json
+import orjson
+from collections import OrderedDict, deque
 from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 # ==== Settings ====
 BINANCE_API = "https://api.binance.com"
+KLINES_1H_URL = BINANCE_API + "/api/v3/klines?interval=1h&limit=6&symbol="
+KLINES_15M_URL = BINANCE_API + "/api/v3/klines?interval=15m&limit=12&symbol="
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
+TELEGRAM_MAX_MSG_LEN = 4096
+TELEGRAM_MSGS_PER_MIN = 20    # Telegram's per-chat send limit
+
 # Your exact thresholds
 MAX_CANDLE_MOVE_1H = 1.0      # ±1% per 1h candle (for both conditions)
 VOL_MULT_THRESHOLD = 1.5      # for accumulation
@@ -35,9 +41,36 @@ CUSTOM_TICKERS = [
     "ZEN","ZIL","ZK","ZRO","0G","2Z","C","D","ENSO","G","HOLO","KITE","LINEA","MIRA","OPEN","S","SAPIEN",
     "SOMI","W","WAL","XPL","ZBT","ZKC","BREV","ZKP"
 ]
+_CANDIDATES = tuple(dict.fromkeys(t.upper() + "USDT" for t in CUSTOM_TICKERS))
 
 LOG_FILE = Path("/tmp/accumulation_log.json")
-reported_signals = set()
+SYMBOLS_CACHE_FILE = Path("/tmp/exchange_info.json")
+SYMBOLS_CACHE_TTL = 6 * 3600  # seconds before exchangeInfo is fetched again
+REPORTED_SIGNALS_MAX = 10_000
+
+telegram_tokens = TELEGRAM_MSGS_PER_MIN
+telegram_last_refill = time.monotonic()
+
+class BoundedSet:
+    """Set that keeps at most maxsize keys, evicting the least recently seen"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+
+    def __contains__(self, key):
+        if key in self._keys:
+            self._keys.move_to_end(key)  # a repeat sighting keeps the key alive
+            return True
+        return False
+
+    def add(self, key):
+        self._keys[key] = True
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.maxsize:
+            self._keys.popitem(last=False)
+
+reported_signals = BoundedSet(REPORTED_SIGNALS_MAX)
 
 session = requests.Session()
 adapter = requests.adapters.HTTPAdapter(pool_connections=100, pool_maxsize=100, max_retries=2)
@@ -45,7 +78,7 @@ session.mount("https://", adapter)
 
 def get_binance_server_time():
     try:
-        return session.get(f"{BINANCE_API}/api/v3/time", timeout=5).json()["serverTime"] / 1000
+        return orjson.loads(session.get(f"{BINANCE_API}/api/v3/time", timeout=5).content)["serverTime"] / 1000
     except:
         return time.time()
 
@@ -55,19 +88,48 @@ def log_signal_to_file(signal_data):
         'data': signal_data
     }
     try:
-        with open(LOG_FILE, 'a') as f:
-            f.write(json.dumps(log_entry) + '\n')
+        with open(LOG_FILE, 'ab') as f:
+            f.write(orjson.dumps(log_entry) + b'\n')
     except Exception:
         pass
 
+def signal_key(signal):
+    return (signal['symbol'], signal['type'], round(signal['price'], 4))
+
+def load_reported_signals():
+    """Seed reported_signals from the signal log so a restart doesn't re-alert"""
+    try:
+        with open(LOG_FILE, 'rb') as f:
+            for line in deque(f, maxlen=REPORTED_SIGNALS_MAX):
+                try:
+                    reported_signals.add(signal_key(orjson.loads(line)['data']))
+                except Exception:
+                    continue
+    except Exception:
+        pass
+
+def wait_for_telegram_slot():
+    """Token bucket: block until another message fits the per-chat rate limit"""
+    global telegram_tokens, telegram_last_refill
+    while True:
+        now = time.monotonic()
+        refill = (now - telegram_last_refill) * TELEGRAM_MSGS_PER_MIN / 60
+        telegram_tokens = min(TELEGRAM_MSGS_PER_MIN, telegram_tokens + refill)
+        telegram_last_refill = now
+        if telegram_tokens >= 1:
+            telegram_tokens -= 1
+            return
+        time.sleep((1 - telegram_tokens) * 60 / TELEGRAM_MSGS_PER_MIN)
+
 def send_telegram(msg, max_retries=3):
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
         print("⚠️ Telegram not configured!")
         return False
+    wait_for_telegram_slot()
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     for attempt in range(max_retries):
         try:
-            response = requests.post(url, data={
+            response = session.post(url, data={
                 "chat_id": TELEGRAM_CHAT_ID,
                 "text": msg,
                 "parse_mode": "HTML"
@@ -79,27 +141,34 @@ def send_telegram(msg, max_retries=3):
                 time.sleep(2)
     return False
 
-def is_price_stable_6h(candles_1h):
-    """Check if last 6 hourly candles each moved within ±1%"""
-    if len(candles_1h) < 6:
-        return False
-    for i in range(-6, 0):
-        c = candles_1h[i]
+def hourly_moves_6h(candles_1h):
+    """Absolute % move of each of the last 6 hourly candles (None if an open is 0)"""
+    moves = []
+    for c in candles_1h[-6:]:
         open_p = float(c[1])
         close = float(c[4])
         if open_p == 0:
-            return False
-        move_pct = abs((close - open_p) / open_p) * 100
+            return None
+        moves.append(abs((close - open_p) / open_p) * 100)
+    return moves
+
+def is_price_stable_6h(moves_1h):
+    """Check if last 6 hourly candles each moved within ±1%"""
+    if moves_1h is None or len(moves_1h) < 6:
+        return False
+    for move_pct in moves_1h:
         if move_pct > MAX_CANDLE_MOVE_1H:
             return False
     return True
 
-def has_volume_spike_15m(candles_15m):
+def avg_volume_15m(volumes):
+    """Average volume of the 8 candles before the last 4"""
+    return sum(volumes[-12:-4]) / 8
+
+def has_volume_spike_15m(volumes, avg_vol):
     """Check volume spike: current ≥1.5x avg, last 3 ≥1.5x avg"""
-    if len(candles_15m) < 12:
+    if len(volumes) < 12:
         return False
-    volumes = [float(c[5]) for c in candles_15m]
-    avg_vol = sum(volumes[-12:-4]) / 8  # avg of 8 candles before last 4
     if avg_vol == 0:
         return False
     last_4_vols = volumes[-4:]
@@ -113,15 +182,18 @@ def has_volume_spike_15m(candles_15m):
 
 def detect_opportunity(symbol):
     try:
-        # Fetch data
-        candles_1h = session.get(f"{BINANCE_API}/api/v3/klines?symbol={symbol}&interval=1h&limit=12", timeout=5).json()
-        candles_15m = session.get(f"{BINANCE_API}/api/v3/klines?symbol={symbol}&interval=15m&limit=20", timeout=5).json()
-        
-        if not candles_1h or len(candles_1h) < 6 or not candles_15m or len(candles_15m) < 12:
+        candles_1h = orjson.loads(session.get(KLINES_1H_URL + symbol, timeout=5).content)
+        if not candles_1h or len(candles_1h) < 6:
             return None
 
-        # Check price stability first (required for both conditions)
-        if not is_price_stable_6h(candles_1h):
+        # Check price stability first (required for both conditions),
+        # so unstable symbols never pay for the 15m request
+        moves_1h = hourly_moves_6h(candles_1h)
+        if not is_price_stable_6h(moves_1h):
+            return None
+
+        candles_15m = orjson.loads(session.get(KLINES_15M_URL + symbol, timeout=5).content)
+        if not candles_15m or len(candles_15m) < 12:
             return None
 
         current_15m = candles_15m[-2]  # last fully closed candle
@@ -129,6 +201,9 @@ def detect_opportunity(symbol):
         close_15m = float(current_15m[4])
         pct_15m = ((close_15m - open_15m) / open_15m) * 100
 
+        volumes_15m = [float(c[5]) for c in candles_15m]
+        avg_vol_8 = avg_volume_15m(volumes_15m)
+
         signal_type = None
         details = {}
 
@@ -138,18 +213,11 @@ def detect_opportunity(symbol):
             details = {'pct_15m': pct_15m}
 
         # 🔹 Condition A: Accumulation (volume spike)
-        elif has_volume_spike_15m(candles_15m):
+        elif has_volume_spike_15m(volumes_15m, avg_vol_8):
             signal_type = "accumulation"
-            avg_vol_8 = sum(float(c[5]) for c in candles_15m[-12:-4]) / 8
-            current_vol = float(candles_15m[-2][5])
+            current_vol = volumes_15m[-2]
             vol_ratio = current_vol / avg_vol_8 if avg_vol_8 > 0 else 0
-            # Calculate max 1h move in last 6h
-            max_move = 0
-            for i in range(-6, 0):
-                c = candles_1h[i]
-                o = float(c[1]); cl = float(c[4])
-                move = abs((cl - o) / o) * 100
-                if move > max_move: max_move = move
+            max_move = max(moves_1h)
             details = {'vol_ratio': vol_ratio, 'max_1h_move_6h': max_move}
 
         if signal_type:
@@ -179,31 +247,77 @@ def format_alert(signal):
     
     if signal['type'] == "momentum":
         pct = signal['details']['pct_15m']
-        msg = f"🚀 <b>MOMENTUM KICK</b> 🚀\n"
-        msg += f"Symbol: <b>{sym}</b>\n"
-        msg += f"Price: ${price:.5f}\n"
-        msg += f"15m Move: +{pct:.2f}%\n\n"
-        msg += f"🔥 Early move after quiet period!"
+        lines = [
+            "🚀 <b>MOMENTUM KICK</b> 🚀",
+            f"Symbol: <b>{sym}</b>",
+            f"Price: ${price:.5f}",
+            f"15m Move: +{pct:.2f}%",
+            "",
+            "🔥 Early move after quiet period!",
+        ]
     else:  # accumulation
         vol_ratio = signal['details']['vol_ratio']
         max_move = signal['details']['max_1h_move_6h']
-        msg = f"🔍 <b>ACCUMULATION ALERT</b> 🔍\n"
-        msg += f"Symbol: <b>{sym}</b>\n"
-        msg += f"Price: ${price:.5f}\n"
-        msg += f"15m Vol: {vol_ratio:.1f}x average\n"
-        msg += f"Max 1h move (last 6h): ±{max_move:.2f}%\n\n"
-        msg += f"⚠️ Strong volume after quiet period!"
+        lines = [
+            "🔍 <b>ACCUMULATION ALERT</b> 🔍",
+            f"Symbol: <b>{sym}</b>",
+            f"Price: ${price:.5f}",
+            f"15m Vol: {vol_ratio:.1f}x average",
+            f"Max 1h move (last 6h): ±{max_move:.2f}%",
+            "",
+            "⚠️ Strong volume after quiet period!",
+        ]
 
-    return msg
+    return "\n".join(lines)
 
-def get_usdt_pairs():
-    candidates = list(dict.fromkeys([t.upper() + "USDT" for t in CUSTOM_TICKERS]))
+def batch_alerts(alerts):
+    """Join alerts into as few messages as fit Telegram's length limit"""
+    batches = []
+    current = ""
+    for alert in alerts:
+        candidate = f"{current}\n\n{alert}" if current else alert
+        if current and len(candidate) > TELEGRAM_MAX_MSG_LEN:
+            batches.append(current)
+            current = alert
+        else:
+            current = candidate
+    if current:
+        batches.append(current)
+    return batches
+
+def load_cached_symbols():
+    """Return (symbols, etag, fresh) from the on-disk cache, or (None, None, False)"""
     try:
-        data = session.get(f"{BINANCE_API}/api/v3/exchangeInfo", timeout=10).json()
-        valid = {s["symbol"] for s in data["symbols"] if s["quoteAsset"] == "USDT" and s["status"] == "TRADING"}
-        return [c for c in candidates if c in valid]
-    except:
-        return []
+        with open(SYMBOLS_CACHE_FILE, 'rb') as f:
+            cached = orjson.loads(f.read())
+        fresh = time.time() - SYMBOLS_CACHE_FILE.stat().st_mtime < SYMBOLS_CACHE_TTL
+        return set(cached["symbols"]), cached.get("etag"), fresh
+    except Exception:
+        return None, None, False
+
+def save_cached_symbols(valid, etag=None):
+    tmp_file = SYMBOLS_CACHE_FILE.with_suffix(".tmp")
+    try:
+        with open(tmp_file, 'wb') as f:
+            f.write(orjson.dumps({'etag': etag, 'symbols': sorted(valid)}))
+        os.replace(tmp_file, SYMBOLS_CACHE_FILE)
+    except Exception:
+        pass
+
+def get_usdt_pairs():
+    valid, etag, fresh = load_cached_symbols()
+    if not fresh:
+        headers = {"If-None-Match": etag} if valid is not None and etag else {}
+        try:
+            response = session.get(f"{BINANCE_API}/api/v3/exchangeInfo", headers=headers, timeout=10)
+            if response.status_code != 304:
+                data = orjson.loads(response.content)
+                valid = {s["symbol"] for s in data["symbols"] if s["quoteAsset"] == "USDT" and s["status"] == "TRADING"}
+                etag = response.headers.get("ETag")
+        except:
+            return []
+        save_cached_symbols(valid, etag)  # also refreshes the mtime on 304
+    return [c for c in _CANDIDATES if c in valid]
 
 def main():
     print("="*60)
@@ -221,24 +335,27 @@ def main():
         return
 
     print(f"✓ Monitoring {len(symbols)} pairs\n")
+    load_reported_signals()
+    clock_offset = get_binance_server_time() - time.time()  # synced once, not per scan
 
     while True:
         signals = scan_all_symbols(symbols)
         fresh_signals = []
 
         for sig in signals:
-            key = (sig['symbol'], sig['type'], round(sig['price'], 4))
-            if key not in reported_signals:
-                reported_signals.add(key)
-                fresh_signals.append(sig)
-                log_signal_to_file(sig)
+            key = signal_key(sig)
+            if key in reported_signals:
+                continue
+            reported_signals.add(key)
+            fresh_signals.append(sig)
+            log_signal_to_file(sig)
 
         if fresh_signals:
-            for sig in fresh_signals:
-                msg = format_alert(sig)
+            alerts = [format_alert(sig) for sig in fresh_signals]
+            for msg in batch_alerts(alerts):
                 send_telegram(msg)
 
-        server_time = get_binance_server_time()
+        server_time = time.time() + clock_offset
         next_interval = (server_time // 900 + 1) * 900
         time.sleep(max(30, next_interval - server_time + 2))
 